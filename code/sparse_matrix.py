@@ -1,4 +1,209 @@
+import os
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress, repeat
+from operator import add, mul
+
+
+# Widest product for which multiply uses a dense per-row accumulator; wider
+# products accumulate each row in a dict instead. The two column-length
+# scratch lists are only touched where a row has products, so the dense
+# accumulator stays ahead until allocating them dominates. Measured
+# crossover is between 100k and 200k columns.
+_DENSE_ACC_MAX_COLS = 10 ** 5
+
+# When at least this fraction of the right-hand matrix is non-zero (and it has
+# at most _DENSE_MAX_CELLS cells), multiply expands it into dense rows and
+# accumulates whole rows at a time instead of scattering single entries.
+# Measured break-even against _csr_multiply is around half full.
+_DENSE_MIN_FILL = 0.5
+_DENSE_MAX_CELLS = 10 ** 7
+
+
+def _value_typecode(values):
+    """
+    Pick the narrowest signed array typecode able to hold every value.
+    :param values: Iterable of matrix values.
+    :return: One of 'h', 'i' or 'q', or None if some value is not an int or
+             needs more than 64 bits, so the values must stay Python objects.
+    """
+    max_abs = 0
+    for value in values:
+        if type(value) is not int:
+            return None
+        if value > max_abs or -value > max_abs:
+            max_abs = abs(value)
+    for typecode in ('h', 'i', 'q'):
+        if max_abs < 1 << (8 * array(typecode).itemsize - 1):
+            return typecode
+    return None
+
+
+def _csr_multiply(a_indptr, a_indices, a_data, b_indptr, b_indices, b_data, ncols):
+    """
+    Multiply two CSR matrices with Gustavson's row-wise algorithm.
+    marker[j] records the last row that touched column j, so the dense
+    accumulator never needs resetting and the touched columns of a row are
+    listed in row_cols. Each row's columns are sorted (O(nnz log nnz) of
+    that row) and its non-zeros emitted with itertools.compress, without a
+    per-column zero test in Python.
+    Products wider than _DENSE_ACC_MAX_COLS are handed to
+    _csr_multiply_hashed, where a per-row dict is cheaper than the scratch
+    lists.
+    :param ncols: Number of columns of the right-hand matrix.
+    :return: Tuple (indptr, indices, data) for the product, columns sorted.
+             data is a list, so values keep Python's arbitrary precision.
+    """
+    if ncols > _DENSE_ACC_MAX_COLS:
+        return _csr_multiply_hashed(a_indptr, a_indices, a_data, b_indptr, b_indices, b_data)
+
+    nrows = len(a_indptr) - 1
+    indptr = array('q', [0]) * (nrows + 1)
+    indices = array('i')
+    data = []
+    acc = [0] * ncols  # Dense accumulator for the current row
+    marker = [-1] * ncols  # Last row that touched each column
+    acc_get = acc.__getitem__
+    indices_extend = indices.extend
+    data_extend = data.extend
+    for i in range(nrows):
+        row_cols = []
+        row_cols_append = row_cols.append
+        for p in range(a_indptr[i], a_indptr[i + 1]):
+            k = a_indices[p]
+            a = a_data[p]
+            for q in range(b_indptr[k], b_indptr[k + 1]):
+                j = b_indices[q]
+                if marker[j] != i:
+                    marker[j] = i
+                    acc[j] = a * b_data[q]
+                    row_cols_append(j)
+                else:
+                    acc[j] += a * b_data[q]
+        row_cols.sort()
+        values = list(map(acc_get, row_cols))
+        indices_extend(compress(row_cols, values))
+        data_extend(compress(values, values))
+        indptr[i + 1] = len(indices)
+    return indptr, indices, data
+
+
+def _csr_multiply_hashed(a_indptr, a_indices, a_data, b_indptr, b_indices, b_data):
+    """
+    Multiply two CSR matrices, accumulating each output row in a dict.
+    The scratch space is proportional to the non-zeros of the current row
+    rather than to the width of the product.
+    :return: Tuple (indptr, indices, data) for the product, columns sorted.
+             data is a list, so values keep Python's arbitrary precision.
+    """
+    nrows = len(a_indptr) - 1
+    indptr = array('q', [0]) * (nrows + 1)
+    indices = array('i')
+    data = []
+    for i in range(nrows):
+        acc = {}
+        acc_get = acc.get
+        for p in range(a_indptr[i], a_indptr[i + 1]):
+            k = a_indices[p]
+            a = a_data[p]
+            for q in range(b_indptr[k], b_indptr[k + 1]):
+                j = b_indices[q]
+                acc[j] = acc_get(j, 0) + a * b_data[q]
+        row_cols = sorted(acc)
+        values = list(map(acc.__getitem__, row_cols))
+        indices.extend(compress(row_cols, values))
+        data.extend(compress(values, values))
+        indptr[i + 1] = len(indices)
+    return indptr, indices, data
+
+
+def _dense_multiply(a_indptr, a_indices, a_data, b_rows, ncols):
+    """
+    Multiply a CSR matrix by a matrix given as dense rows.
+    Each output row is built by adding whole scaled rows of B with map(),
+    so the per-element arithmetic runs inside the interpreter's C loops.
+    :param b_rows: List of the rows of B, each a list of ncols values.
+    :param ncols: Number of columns of B.
+    :return: Tuple (indptr, indices, data) for the product, columns sorted.
+             data is a list, so values keep Python's arbitrary precision.
+    """
+    nrows = len(a_indptr) - 1
+    indptr = array('q', [0]) * (nrows + 1)
+    indices = array('i')
+    data = []
+    zero_row = [0] * ncols
+    for i in range(nrows):
+        acc = zero_row
+        for p in range(a_indptr[i], a_indptr[i + 1]):
+            acc = list(map(add, acc, map(mul, b_rows[a_indices[p]], repeat(a_data[p]))))
+        indices.extend(compress(range(ncols), acc))
+        data.extend(compress(acc, acc))
+        indptr[i + 1] = len(indices)
+    return indptr, indices, data
+
+
+def _available_cpus():
+    """
+    Count the CPUs this process is allowed to run on.
+    Unlike os.cpu_count(), this honours the CPU affinity mask where the
+    platform exposes it.
+    :return: Number of usable CPUs, at least 1.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _csr_multiply_parallel(a_indptr, a_indices, a_data, b_indptr, b_indices, b_data, ncols, workers=None):
+    """
+    Multiply two CSR matrices across worker processes.
+    The rows of A are cut into blocks holding roughly equal numbers of
+    non-zeros; each worker multiplies one block with _csr_multiply and
+    returns its own CSR buffers. Blocks cover disjoint output rows, so the
+    results are simply concatenated in row order.
+    :param workers: Number of worker processes, defaulting to the number of
+                    usable CPUs.
+    :return: Tuple (indptr, indices, data) for the product.
+    """
+    workers = workers or _available_cpus()
+    nrows = len(a_indptr) - 1
+    if workers < 2 or nrows < 2:
+        return _csr_multiply(a_indptr, a_indices, a_data, b_indptr, b_indices, b_data, ncols)
+
+    nnz = a_indptr[nrows]
+
+    bounds = [0]
+    for w in range(1, workers):
+        row = bisect_left(a_indptr, nnz * w // workers, bounds[-1], nrows)
+        if row > bounds[-1]:
+            bounds.append(row)
+    bounds.append(nrows)
+
+    with ProcessPoolExecutor(workers) as pool:
+        futures = []
+        for lo, hi in zip(bounds, bounds[1:]):
+            start, end = a_indptr[lo], a_indptr[hi]
+            block_indptr = array('q', (p - start for p in a_indptr[lo:hi + 1]))
+            futures.append(pool.submit(
+                _csr_multiply, block_indptr, a_indices[start:end], a_data[start:end],
+                b_indptr, b_indices, b_data, ncols))
+
+        indptr = array('q', [0])
+        indices = array('i')
+        data = []
+        for future in futures:
+            block_indptr, block_indices, block_data = future.result()
+            offset = len(indices)
+            indptr.extend(p + offset for p in block_indptr[1:])
+            indices.extend(block_indices)
+            data.extend(block_data)
+    return indptr, indices, data
+
+
 class SparseMatrix:
+    __slots__ = ('rows', 'cols', 'data')  # No per-instance __dict__
+
     def __init__(self, rows=0, cols=0):
         """
         Initialize a sparse matrix with given dimensions.
@@ -17,15 +222,24 @@ class SparseMatrix:
         :return: A SparseMatrix object.
         """
         try:
-            with open(filePath, 'r') as file:
-                lines = [line.strip() for line in file if line.strip()]  # Ignore empty lines
+            # Read the raw bytes in one call and split them into lines; int()
+            # parses bytes directly, so the text is never decoded
+            with open(filePath, 'rb') as file:
+                lines = file.read().splitlines()
 
-            # Parse number of rows and columns
-            if len(lines) < 2:
+            # Parse number of rows and columns from the first two non-empty lines
+            header = []
+            body_start = 0
+            while len(header) < 2 and body_start < len(lines):
+                line = lines[body_start].strip()
+                if line:
+                    header.append(line)
+                body_start += 1
+            if len(header) < 2:
                 raise ValueError("Input file must have at least two lines for rows and cols.")
             
-            rows_line = lines[0].split('=')
-            cols_line = lines[1].split('=')
+            rows_line = header[0].split(b'=')
+            cols_line = header[1].split(b'=')
             if len(rows_line) != 2 or len(cols_line) != 2:
                 raise ValueError("Invalid format for rows or cols definition.")
             
@@ -33,25 +247,34 @@ class SparseMatrix:
             cols = int(cols_line[1])
 
             matrix = SparseMatrix(rows, cols)
+            data = matrix.data
+            pop = data.pop
 
-            # Parse matrix entries
-            for line in lines[2:]:
-                if not line.startswith('(') or not line.endswith(')'):
-                    raise ValueError(f"Invalid format: Expected '(row, col, value)', got {line}")
+            # Parse matrix entries; later entries overwrite earlier ones and a
+            # zero value deletes the position, as with setElement
+            for line in lines[body_start:]:
+                line = line.strip()
+                if not line:
+                    continue
+                if line[0] != 0x28 or line[-1] != 0x29:  # '(' and ')'
+                    raise ValueError(f"Invalid format: Expected '(row, col, value)', got {line.decode(errors='replace')}")
                 
-                parts = line[1:-1].split(',')
+                parts = line[1:-1].split(b',')
                 if len(parts) != 3:
-                    raise ValueError(f"Invalid format: Expected three values, got {parts}")
+                    raise ValueError(f"Invalid format: Expected three values, got {line.decode(errors='replace')}")
                 
                 row, col, value = map(int, parts)
-                if row >= rows or col >= cols:
+                if not (0 <= row < rows and 0 <= col < cols):
                     raise ValueError(f"Index out of bounds: ({row}, {col})")
                 
-                matrix.setElement(row, col, value)
+                if value:
+                    data[row, col] = value
+                else:
+                    pop((row, col), None)
             return matrix
         except Exception as e:
             print(f"Error reading file: {e}")
-            raise ValueError("Input file has wrong format")
+            raise ValueError("Input file has wrong format") from e
 
     def getElement(self, row, col):
         """
@@ -69,12 +292,93 @@ class SparseMatrix:
         :param col: Column index.
         :param value: Value to set.
         """
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            raise ValueError(f"Index out of bounds: ({row}, {col})")
         if value == 0:
             if (row, col) in self.data:
                 del self.data[(row, col)]
         else:
             self.data[(row, col)] = value
 
+    def _to_csr(self, sort_columns=True):
+        """
+        Build a compressed sparse row (CSR) view of the matrix.
+        Entries are bucketed by row in a single pass over the data, so no
+        sort is needed unless sorted columns are requested.
+        :param sort_columns: Whether the columns within each row must be sorted.
+        :return: Tuple (indptr, indices, data) of arrays. The entries of row i
+                 are indices[indptr[i]:indptr[i + 1]] with their values in the
+                 same slice of data, which uses the narrowest integer type that
+                 fits every value (a list when a value exceeds 64 bits).
+        """
+        indptr = array('q', [0]) * (self.rows + 1)
+        for row, _ in self.data:
+            indptr[row + 1] += 1
+        for row in range(self.rows):
+            indptr[row + 1] += indptr[row]
+
+        nnz = indptr[self.rows]
+        indices = array('i', [0]) * nnz
+        typecode = _value_typecode(self.data.values())
+        data = array(typecode, [0]) * nnz if typecode else [0] * nnz
+        fill = indptr[:-1]  # Next free slot of each row
+        items = sorted(self.data.items()) if sort_columns else self.data.items()
+        for (row, col), value in items:
+            p = fill[row]
+            indices[p] = col
+            data[p] = value
+            fill[row] = p + 1
+        return indptr, indices, data
+
+    def _to_dense(self):
+        """
+        Expand the matrix into dense rows.
+        :return: List of rows, each a list of self.cols values.
+        """
+        dense = [[0] * self.cols for _ in range(self.rows)]
+        for (row, col), value in self.data.items():
+            dense[row][col] = value
+        return dense
+
+    @staticmethod
+    def _from_csr(rows, cols, indptr, indices, data):
+        """
+        Build a SparseMatrix from CSR buffers.
+        :param rows: Number of rows in the matrix.
+        :param cols: Number of columns in the matrix.
+        :param indptr: Row offsets into indices and data.
+        :param indices: Column index of each stored value.
+        :param data: Non-zero values.
+        :return: A SparseMatrix object.
+        """
+        matrix = SparseMatrix(rows, cols)
+        out = matrix.data
+        for i in range(rows):
+            for p in range(indptr[i], indptr[i + 1]):
+                out[(i, indices[p])] = data[p]
+        return matrix
+
+    def _merge_into(self, other, sign):
+        """
+        Fold sign * other into this matrix in place, dropping any entries
+        that cancel out. Dimensions must already have been checked.
+        :param other: Another SparseMatrix object.
+        :param sign: 1 for addition, -1 for subtraction.
+        :return: This SparseMatrix, updated.
+        """
+        out = self.data
+        get = out.get
+        pop = out.pop
+        # Snapshot the entries when merging a matrix into itself
+        items = list(other.data.items()) if other is self else other.data.items()
+        for pos, value in items:
+            value = get(pos, 0) + sign * value
+            if value != 0:
+                out[pos] = value
+            else:
+                pop(pos, None)
+        return self
+
     def add(self, other):
         """
         Add two sparse matrices.
@@ -85,13 +389,21 @@ class SparseMatrix:
             raise ValueError("Matrices must have the same dimensions for addition.")
         
         result = SparseMatrix(self.rows, self.cols)
-        for pos in self.data:
-            result.setElement(pos[0], pos[1], self.data[pos] + other.getElement(pos[0], pos[1]))
-        for pos in other.data:
-            if pos not in self.data:
-                result.setElement(pos[0], pos[1], other.data[pos])
+        result.data = dict(self.data)
+        return result._merge_into(other, 1)
+
+    def iadd(self, other):
+        """
+        Add another sparse matrix into this one in place.
+        Unlike add, no copy of this matrix is made, which suits running sums
+        such as a.add(b).iadd(c) where the left operand is not needed again.
+        :param other: Another SparseMatrix object.
+        :return: This SparseMatrix, updated to the sum.
+        """
+        if self.rows != other.rows or self.cols != other.cols:
+            raise ValueError("Matrices must have the same dimensions for addition.")
         
-        return result
+        return self._merge_into(other, 1)
 
     def subtract(self, other):
         """
@@ -103,44 +415,59 @@ class SparseMatrix:
             raise ValueError("Matrices must have the same dimensions for subtraction.")
         
         result = SparseMatrix(self.rows, self.cols)
-        for pos in self.data:
-            result.setElement(pos[0], pos[1], self.data[pos] - other.getElement(pos[0], pos[1]))
-        for pos in other.data:
-            if pos not in self.data:
-                result.setElement(pos[0], pos[1], -other.data[pos])
+        result.data = dict(self.data)
+        return result._merge_into(other, -1)
+
+    def isubtract(self, other):
+        """
+        Subtract another sparse matrix from this one in place.
+        Unlike subtract, no copy of this matrix is made.
+        :param other: Another SparseMatrix object.
+        :return: This SparseMatrix, updated to the difference.
+        """
+        if self.rows != other.rows or self.cols != other.cols:
+            raise ValueError("Matrices must have the same dimensions for subtraction.")
         
-        return result
+        return self._merge_into(other, -1)
 
-    def multiply(self, other):
+    def multiply(self, other, workers=1):
         """
         Multiply two sparse matrices.
+        Uses Gustavson's row-wise algorithm over CSR views, so only stored
+        entries are visited: the work is O(nnz(self) * average row nnz of
+        other) rather than rows * cols * K. A mostly-filled other is
+        multiplied as dense rows instead.
         :param other: Another SparseMatrix object.
+        :param workers: Number of processes to split the rows across; None uses
+                        every usable CPU. Anything other than 1 starts a process
+                        pool, so scripts calling it need an
+                        'if __name__ == "__main__":' guard.
         :return: A new SparseMatrix representing the product.
         """
         if self.cols != other.rows:
             raise ValueError("Number of columns in first matrix must equal number of rows in second matrix.")
         
-        result = SparseMatrix(self.rows, other.cols)
-        for i in range(self.rows):
-            for j in range(other.cols):
-                total = 0
-                for k in range(self.cols):
-                    total += self.getElement(i, k) * other.getElement(k, j)
-                if total != 0:
-                    result.setElement(i, j, total)
-        
-        return result
+        a = self._to_csr(sort_columns=False)
+        cells = other.rows * other.cols
+        if 0 < cells <= _DENSE_MAX_CELLS and len(other.data) >= _DENSE_MIN_FILL * cells:
+            indptr, indices, data = _dense_multiply(*a, other._to_dense(), other.cols)
+        else:
+            b = other._to_csr(sort_columns=False)
+            if workers != 1:
+                indptr, indices, data = _csr_multiply_parallel(*a, *b, other.cols, workers)
+            else:
+                indptr, indices, data = _csr_multiply(*a, *b, other.cols)
+        return SparseMatrix._from_csr(self.rows, other.cols, indptr, indices, data)
 
     def writeToFile(self, outputPath):
         """
         Write the sparse matrix to a file.
         :param outputPath: Path to the output file.
         """
+        # Build the whole file in memory and hand it to a single write call
+        entries = "".join(f"({row}, {col}, {value})\n" for (row, col), value in self.data.items())
         with open(outputPath, 'w') as file:
-            file.write(f"rows={self.rows}\n")
-            file.write(f"cols={self.cols}\n")
-            for (row, col), value in self.data.items():
-                file.write(f"({row}, {col}, {value})\n")
+            file.write(f"rows={self.rows}\ncols={self.cols}\n{entries}")
 
 
 # Main Program
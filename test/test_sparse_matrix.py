@@ -0,0 +1,314 @@
+import os
+import random
+import sys
+import tempfile
+import unittest
+from fractions import Fraction
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+import sparse_matrix
+from sparse_matrix import SparseMatrix
+
+
+def random_matrix(rng, rows, cols, fill):
+    """
+    Build a matrix whose cells are non-zero with probability fill.
+    """
+    matrix = SparseMatrix(rows, cols)
+    for i in range(rows):
+        for j in range(cols):
+            if rng.random() < fill:
+                matrix.setElement(i, j, rng.randint(-9, 9))
+    return matrix
+
+
+def naive_multiply(a, b):
+    """
+    Reference product computed cell by cell through getElement.
+    """
+    result = {}
+    for i in range(a.rows):
+        for j in range(b.cols):
+            total = sum(a.getElement(i, k) * b.getElement(k, j) for k in range(a.cols))
+            if total != 0:
+                result[(i, j)] = total
+    return result
+
+
+def cancelling_pair(rows, cols, fill, rng):
+    """
+    Build A (rows x 2) and B (2 x cols) whose product is exactly zero:
+    every row of A is [1, 1] and the second row of B negates the first.
+    """
+    a = SparseMatrix(rows, 2)
+    for i in range(rows):
+        a.setElement(i, 0, 1)
+        a.setElement(i, 1, 1)
+    b = SparseMatrix(2, cols)
+    for j in range(cols):
+        if rng.random() < fill:
+            value = rng.randint(1, 9)
+            b.setElement(0, j, value)
+            b.setElement(1, j, -value)
+    return a, b
+
+
+class TestMultiplyPaths(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(1234)
+
+    def assertProduct(self, a, b, **kwargs):
+        self.assertEqual(a.multiply(b, **kwargs).data, naive_multiply(a, b))
+
+    def test_sparse_path(self):
+        for _ in range(50):
+            rows, inner, cols = (self.rng.randint(8, 16) for _ in range(3))
+            a = random_matrix(self.rng, rows, inner, 0.3)
+            b = random_matrix(self.rng, inner, cols, 0.2)
+            with mock.patch.object(sparse_matrix, '_dense_multiply') as dense:
+                self.assertProduct(a, b)
+            dense.assert_not_called()
+
+    def test_dense_path(self):
+        a = random_matrix(self.rng, 20, 15, 0.3)
+        b = random_matrix(self.rng, 15, 25, 0.9)
+        with mock.patch.object(sparse_matrix, '_dense_multiply', wraps=sparse_matrix._dense_multiply) as dense:
+            self.assertProduct(a, b)
+        dense.assert_called_once()
+
+    def test_dense_path_cancels_to_zero(self):
+        a, b = cancelling_pair(5, 10, 1.0, self.rng)
+        with mock.patch.object(sparse_matrix, '_dense_multiply', wraps=sparse_matrix._dense_multiply) as dense:
+            self.assertEqual(a.multiply(b).data, {})
+        dense.assert_called_once()
+
+    @mock.patch.object(sparse_matrix, '_DENSE_ACC_MAX_COLS', 64)
+    def test_hashed_path(self):
+        a = random_matrix(self.rng, 8, 10, 0.4)
+        b = random_matrix(self.rng, 10, 164, 0.05)
+        with mock.patch.object(sparse_matrix, '_csr_multiply_hashed',
+                               wraps=sparse_matrix._csr_multiply_hashed) as hashed:
+            self.assertProduct(a, b)
+        hashed.assert_called_once()
+
+    @mock.patch.object(sparse_matrix, '_DENSE_ACC_MAX_COLS', 64)
+    def test_hashed_path_cancels_to_zero(self):
+        a, b = cancelling_pair(4, 164, 0.1, self.rng)
+        with mock.patch.object(sparse_matrix, '_csr_multiply_hashed',
+                               wraps=sparse_matrix._csr_multiply_hashed) as hashed:
+            self.assertEqual(a.multiply(b).data, {})
+        hashed.assert_called_once()
+
+    def test_sparse_path_cancels_to_zero(self):
+        a, b = cancelling_pair(6, 30, 0.2, self.rng)
+        self.assertEqual(a.multiply(b).data, {})
+
+    def test_parallel_path(self):
+        a = random_matrix(self.rng, 40, 30, 0.2)
+        b = random_matrix(self.rng, 30, 35, 0.2)
+        with mock.patch.object(sparse_matrix, '_csr_multiply_parallel',
+                               wraps=sparse_matrix._csr_multiply_parallel) as parallel:
+            self.assertProduct(a, b, workers=3)
+        parallel.assert_called_once()
+
+    def test_parallel_path_cancels_to_zero(self):
+        a, b = cancelling_pair(12, 30, 0.3, self.rng)
+        self.assertEqual(a.multiply(b, workers=2).data, {})
+
+    def test_parallel_blocks_match_serial_kernel(self):
+        a = random_matrix(self.rng, 25, 20, 0.3)
+        b = random_matrix(self.rng, 20, 22, 0.3)
+        a_csr = a._to_csr(sort_columns=False)
+        b_csr = b._to_csr(sort_columns=False)
+        expected = sparse_matrix._csr_multiply(*a_csr, *b_csr, b.cols)
+        for workers in (2, 3, 5):
+            self.assertEqual(sparse_matrix._csr_multiply_parallel(*a_csr, *b_csr, b.cols, workers), expected)
+
+    def test_dimension_mismatch(self):
+        with self.assertRaises(ValueError):
+            SparseMatrix(2, 3).multiply(SparseMatrix(2, 3))
+
+
+class TestMultiplyResults(unittest.TestCase):
+    def test_product_beyond_int64(self):
+        big = SparseMatrix(1, 1)
+        big.setElement(0, 0, 10 ** 10)
+        self.assertEqual(big.multiply(big).getElement(0, 0), 10 ** 20)
+        self.assertEqual(big.multiply(big, workers=2).getElement(0, 0), 10 ** 20)
+
+    def test_operands_beyond_int64(self):
+        b = SparseMatrix(2, 2)
+        b.setElement(0, 0, 2 ** 70)
+        b.setElement(1, 0, -(2 ** 63))
+        self.assertEqual(b.multiply(b).data, {(0, 0): 2 ** 140, (1, 0): -(2 ** 133)})
+
+        total = SparseMatrix(2, 2)
+        for _ in range(3):
+            total = total.add(b)
+        self.assertEqual(total.multiply(b).getElement(0, 0), 3 * 2 ** 140)
+
+    def test_non_integer_values(self):
+        a = SparseMatrix(2, 2)
+        a.setElement(0, 0, 2.5)
+        b = SparseMatrix(2, 2)
+        b.setElement(0, 1, 1.5)
+        self.assertEqual(a.multiply(b).data, {(0, 1): 3.75})
+
+        a.setElement(1, 0, Fraction(1, 3))
+        b.setElement(0, 0, 3)
+        self.assertEqual(a.multiply(b).data, {(0, 0): 7.5, (0, 1): 3.75, (1, 0): 1, (1, 1): Fraction(1, 2)})
+        self.assertEqual(a.multiply(b, workers=2).data, a.multiply(b).data)
+
+    def test_wide_product_beyond_int64(self):
+        a = SparseMatrix(1, 1)
+        a.setElement(0, 0, 10 ** 10)
+        b = SparseMatrix(1, sparse_matrix._DENSE_ACC_MAX_COLS + 1)
+        b.setElement(0, 5, 10 ** 10)
+        self.assertEqual(a.multiply(b).getElement(0, 5), 10 ** 20)
+
+    def test_rows_written_in_column_order(self):
+        a = SparseMatrix(1, 4)
+        a.setElement(0, 0, 2)
+        a.setElement(0, 1, 3)
+        b = SparseMatrix(4, 4)
+        b.setElement(0, 3, 7)
+        b.setElement(1, 0, 5)
+        result = a.multiply(b)
+        self.assertEqual(list(result.data), [(0, 0), (0, 3)])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'result.txt')
+            result.writeToFile(path)
+            with open(path) as file:
+                self.assertEqual(file.read(), "rows=1\ncols=4\n(0, 0, 15)\n(0, 3, 14)\n")
+
+    def test_every_path_emits_sorted_rows(self):
+        rng = random.Random(99)
+        cases = [
+            (random_matrix(rng, 10, 12, 0.4), random_matrix(rng, 12, 30, 0.2), {}),
+            (random_matrix(rng, 10, 12, 0.4), random_matrix(rng, 12, 30, 0.8), {}),
+            (random_matrix(rng, 6, 8, 0.5), random_matrix(rng, 8, sparse_matrix._DENSE_ACC_MAX_COLS + 50, 0.0001), {}),
+            (random_matrix(rng, 10, 12, 0.4), random_matrix(rng, 12, 30, 0.2), {'workers': 2}),
+        ]
+        for a, b, kwargs in cases:
+            keys = list(a.multiply(b, **kwargs).data)
+            self.assertEqual(keys, sorted(keys))
+
+
+class TestAddSubtract(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(42)
+        self.a = random_matrix(rng, 9, 7, 0.4)
+        self.b = random_matrix(rng, 9, 7, 0.4)
+
+    def expected(self, sign):
+        cells = ((i, j) for i in range(self.a.rows) for j in range(self.a.cols))
+        values = {pos: self.a.getElement(*pos) + sign * self.b.getElement(*pos) for pos in cells}
+        return {pos: value for pos, value in values.items() if value != 0}
+
+    def test_add_and_subtract(self):
+        before = dict(self.a.data)
+        self.assertEqual(self.a.add(self.b).data, self.expected(1))
+        self.assertEqual(self.a.subtract(self.b).data, self.expected(-1))
+        self.assertEqual(self.a.data, before)
+
+    def test_in_place(self):
+        for method, sign in (('iadd', 1), ('isubtract', -1)):
+            with self.subTest(method=method):
+                expected = self.expected(sign)
+                a = SparseMatrix(self.a.rows, self.a.cols)
+                a.data = dict(self.a.data)
+                data = a.data
+                self.assertIs(getattr(a, method)(self.b), a)
+                self.assertIs(a.data, data)
+                self.assertEqual(a.data, expected)
+
+    def test_cancelling_entries_removed(self):
+        negated = SparseMatrix(self.a.rows, self.a.cols)
+        negated.data = {pos: -value for pos, value in self.a.data.items()}
+        self.assertEqual(self.a.add(negated).data, {})
+        self.assertEqual(self.a.subtract(self.a).data, {})
+        self.assertEqual(negated.iadd(self.a).data, {})
+
+    def test_with_itself(self):
+        doubled = {pos: 2 * value for pos, value in self.a.data.items()}
+        self.assertEqual(self.a.iadd(self.a).data, doubled)
+        self.assertEqual(self.a.isubtract(self.a).data, {})
+
+    def test_dimension_mismatch(self):
+        other = SparseMatrix(self.a.rows, self.a.cols + 1)
+        for method in ('add', 'subtract', 'iadd', 'isubtract'):
+            with self.subTest(method=method), self.assertRaises(ValueError):
+                getattr(self.a, method)(other)
+
+
+class TestReadFile(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'matrix.txt')
+
+    def read(self, text):
+        with open(self.path, 'w', newline='') as file:
+            file.write(text)
+        return SparseMatrix.readFile(self.path)
+
+    def test_value_beyond_int64(self):
+        matrix = self.read("rows=2\ncols=2\n(0, 1, 99999999999999999999)\n")
+        self.assertEqual(matrix.getElement(0, 1), 99999999999999999999)
+
+    def test_later_entries_win_and_zero_deletes(self):
+        matrix = self.read("rows=3\ncols=3\n(0, 0, 4)\n(1, 1, 2)\n(0, 0, 0)\n(1, 1, 7)\n(2, 2, 0)\n")
+        self.assertEqual(matrix.data, {(1, 1): 7})
+
+    def test_lenient_spacing_and_signs(self):
+        matrix = self.read("\n rows = 3 \n\n\tcols=4\r\n ( 0 , 1 , +5 )\r\n\n(2,3,-3)")
+        self.assertEqual((matrix.rows, matrix.cols), (3, 4))
+        self.assertEqual(matrix.data, {(0, 1): 5, (2, 3): -3})
+
+    def test_line_endings(self):
+        for newline in ("\n", "\r\n", "\r"):
+            with self.subTest(newline=newline):
+                matrix = self.read(newline.join(["rows=2", "cols=2", "(0,1,5)", "(1,0,6)", ""]))
+                self.assertEqual(matrix.data, {(0, 1): 5, (1, 0): 6})
+
+    @unittest.skipUnless(os.path.isdir('/dev/fd'), "needs /dev/fd")
+    def test_pipe(self):
+        read_fd, write_fd = os.pipe()
+        with os.fdopen(read_fd, 'rb') as reader:
+            with os.fdopen(write_fd, 'wb') as writer:
+                writer.write(b"rows=2\ncols=2\n(0, 1, 5)\n")
+            matrix = SparseMatrix.readFile(f'/dev/fd/{reader.fileno()}')
+        self.assertEqual(matrix.data, {(0, 1): 5})
+
+    def test_invalid_files(self):
+        for text in ["", "rows=2\n", "rows=2\ncols\n", "rows=x\ncols=2\n",
+                     "rows=2\ncols=2\n(0, 1)\n", "rows=2\ncols=2\n[0, 1, 1]\n",
+                     "rows=2\ncols=2\n(0, 1, 1) (1, 1, 1)\n", "rows=2\ncols=2\n(2, 0, 1)\n",
+                     "rows=2\ncols=2\n(0, -1, 1)\n", "rows=2\ncols=2\n(0, 1, a)\n"]:
+            with self.subTest(text=text), mock.patch('builtins.print'):
+                with self.assertRaises(ValueError):
+                    self.read(text)
+
+    def test_round_trip(self):
+        rng = random.Random(5)
+        matrix = random_matrix(rng, 15, 12, 0.3)
+        matrix.writeToFile(self.path)
+        self.assertEqual(SparseMatrix.readFile(self.path).data, matrix.data)
+
+
+class TestSetElement(unittest.TestCase):
+    def test_out_of_range_index(self):
+        matrix = SparseMatrix(2, 3)
+        matrix.setElement(1, 2, 4)
+        for row, col in [(-1, 0), (0, -1), (2, 0), (0, 3)]:
+            with self.subTest(row=row, col=col), self.assertRaises(ValueError):
+                matrix.setElement(row, col, 1)
+        self.assertEqual(matrix.data, {(1, 2): 4})
+        self.assertEqual(matrix.multiply(SparseMatrix(3, 2)).data, {})
+
+
+if __name__ == "__main__":
+    unittest.main()